@@ -6,11 +6,18 @@
 支持批量转换，可选择是否删除原文件
 """
 
+import asyncio
+import json
 import os
+import re
+import shutil
+import signal
 import subprocess
 import threading
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
+from collections import deque
 from pathlib import Path
 import queue
 try:
@@ -18,6 +25,58 @@ try:
     HAS_DND = True
 except ImportError:
     HAS_DND = False
+try:
+    import fcntl
+    HAS_PIPE_RESIZE = hasattr(fcntl, 'F_SETPIPE_SZ')  # 仅 Linux 提供
+except ImportError:
+    HAS_PIPE_RESIZE = False
+try:
+    from send2trash import send2trash
+    HAS_SEND2TRASH = True
+except ImportError:
+    HAS_SEND2TRASH = False
+
+
+# 各输出格式的编码参数表：格式 -> (编码器, 额外参数, {质量档位: 比特率})
+# 编码器为 None 表示 AAC，运行时由 _aac_codec() 按探测结果选择；
+# 比特率表为 None 表示无损格式，质量档位控制采样率而非比特率
+_CODEC_TABLE = {
+    'mp3':  ('libmp3lame', [], {'高质量': '192k', '中等质量': '128k', '低质量': '64k'}),
+    'flac': ('flac', [], None),
+    'wav':  ('pcm_s16le', [], None),
+    'ogg':  ('libvorbis', [], {'高质量': '256k', '中等质量': '192k', '低质量': '128k'}),
+    'm4a':  (None, ['-f', 'mov'], {'高质量': '256k', '中等质量': '192k', '低质量': '128k'}),  # m4a 使用 mov 容器
+    'aac':  (None, [], {'高质量': '192k', '中等质量': '128k', '低质量': '64k'}),
+    'wma':  ('wmav2', [], {'高质量': '192k', '中等质量': '128k', '低质量': '64k'}),
+}
+
+# 支持的音频扩展名（不含点号，便于目录遍历时直接比较文件名后缀）
+_AUDIO_EXT_NAMES = frozenset({
+    'flac', 'wav', 'ogg', 'm4a', 'aac', 'wma', 'mp3', 'opus', 'aiff', 'au',
+})
+
+# 同一组扩展名的带点号版本，供 Path.suffix 比较使用
+_SUPPORTED_EXTS = frozenset('.' + ext for ext in _AUDIO_EXT_NAMES)
+
+# 质量档位标签 -> 默认比特率（kbps）
+_QUALITY_BITRATE = {'高质量': '192', '中等质量': '128', '低质量': '64'}
+
+# 目标格式 -> 输入流可直接拷贝（无需重编码）的编码器名
+_COPYABLE_CODEC = {
+    'mp3': 'mp3',
+    'flac': 'flac',
+    'wav': 'pcm_s16le',
+    'ogg': 'vorbis',
+    'm4a': 'aac',
+    'aac': 'aac',
+    'wma': 'wmav2',
+}
+
+# Tk 拖拽数据的分词：带空格的路径以 {大括号} 包裹，其余以空白分隔
+_DND_RE = re.compile(r'\{([^}]*)\}|(\S+)')
+
+# ffmpeg 错误分类：一次扫描定位第一个关键错误标记
+_ERR_RE = re.compile(rb'Invalid data|Permission denied|No space left|Error[^\n]*')
 
 
 class AudioConverterApp:
@@ -34,6 +93,53 @@ class AudioConverterApp:
         self.file_list = []
         self.conversion_queue = queue.Queue()
         self.is_converting = False
+
+        # 日志缓冲：积累 50ms 内的日志一次性写入，避免逐条重绘
+        self._log_buf = deque()
+        self._log_flush_pending = False
+
+        # 进度刷新节流的时间戳
+        self._last_ui_update = 0.0
+
+        # 每个 ffmpeg 进程允许使用的线程数（转换开始时按并行任务数重新计算）
+        self.ffmpeg_threads_per_job = 1
+
+        # 转换批次的设置快照：start_conversion 在主线程里填充，
+        # 工作线程只读快照，不碰 Tcl 变量
+        self._batch_output_format = 'mp3'
+        self._batch_quality = ''
+        self._batch_delete_original = False
+        self._batch_worker_count = 1
+
+        # 启动时探测一次 ffmpeg 路径和可用编码器，转换时直接复用
+        self._ffmpeg_path, self._encoders = self._probe_ffmpeg()
+
+        # 在跑的 ffmpeg 进程句柄，停止转换时立即终止而不是干等超时
+        self._active_procs = set()
+
+        # ffprobe 与 ffmpeg 通常同目录；探测结果按 (路径, mtime) 缓存
+        self._ffprobe_path = shutil.which(
+            'ffprobe',
+            path=os.path.dirname(self._ffmpeg_path) + os.pathsep + os.environ.get('PATH', '')
+        ) or 'ffprobe'
+        self._probe_cache = {}
+
+        # 子进程的固定启动参数只构建一次：Windows 的 STARTUPINFO 没必要
+        # 每次转换重新创建（PATH 增广也已在探测 ffmpeg 时一次性完成）
+        self._exec_kwargs = {
+            'stdout': asyncio.subprocess.DEVNULL,
+            'stderr': asyncio.subprocess.PIPE,
+            'limit': 1024 * 1024,
+        }
+        if os.name == 'nt':
+            # Windows: 不弹出控制台窗口
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            self._exec_kwargs['startupinfo'] = startupinfo
+            self._exec_kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+        else:
+            # POSIX: 独立进程组，停止转换时可以 killpg 一锅端
+            self._exec_kwargs['start_new_session'] = True
         
         # 设置输出目录为"音乐"文件夹
         self.output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "音乐")
@@ -46,7 +152,11 @@ class AudioConverterApp:
         
         # 创建界面
         self.create_widgets()
-        
+
+        # 启动界面事件泵：工作线程的所有界面更新都经 conversion_queue
+        # 投递，由主线程在泵里统一执行（Tk 不是线程安全的）
+        self.root.after(33, self._pump)
+
     def setup_styles(self):
         """设置界面样式"""
         style = ttk.Style()
@@ -212,26 +322,39 @@ class AudioConverterApp:
             width=20
         )
         self.quality_combo.grid(row=1, column=1, columnspan=2, sticky=tk.W, padx=(8, 0))
-        
+
+        # 并行任务数选项（ffmpeg 是子进程，多个任务可以同时跑满多核）
+        worker_label = ttk.Label(options_frame, text="并行任务数:")
+        worker_label.grid(row=2, column=0, sticky=tk.W, pady=(8, 0))
+
+        cpu_count = os.cpu_count() or 1
+        self.worker_count_var = tk.IntVar(value=cpu_count)
+        worker_spin = ttk.Spinbox(
+            options_frame,
+            textvariable=self.worker_count_var,
+            from_=1,
+            to=cpu_count,
+            state="readonly",
+            width=10
+        )
+        worker_spin.grid(row=2, column=1, sticky=tk.W, padx=(8, 0), pady=(8, 0))
+
         # 进度区域
         progress_frame = ttk.LabelFrame(main_frame, text="📊 转换进度", padding="12")
         progress_frame.grid(row=3, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 12))
         progress_frame.columnconfigure(0, weight=1)
         
-        # 进度条
-        self.progress_var = tk.DoubleVar(value=0)
+        # 进度条（不绑定 Tcl 变量，热路径直接配置控件，绕过变量 trace）
         self.progress_bar = ttk.Progressbar(
             progress_frame,
-            variable=self.progress_var,
             maximum=100,
             mode='determinate'
         )
         self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 8))
-        
+
         # 状态标签
-        self.status_var = tk.StringVar(value="等待选择文件...")
-        status_label = ttk.Label(progress_frame, textvariable=self.status_var, style='Status.TLabel')
-        status_label.grid(row=1, column=0, sticky=tk.W)
+        self.status_label = ttk.Label(progress_frame, text="等待选择文件...", style='Status.TLabel')
+        self.status_label.grid(row=1, column=0, sticky=tk.W)
         
         # 日志输出
         log_frame = ttk.LabelFrame(main_frame, text="📝 转换日志", padding="12")
@@ -291,12 +414,80 @@ class AudioConverterApp:
         )
         self.clear_btn.pack(side=tk.LEFT)
         
+    def _pump(self, _interval=33):
+        """主循环定时泵：排空转换线程投递的界面事件
+
+        工作线程只调用 conversion_queue.put，所有 Tk 操作由主线程
+        在这里统一执行；每个节拍最多处理 64 条，避免事件风暴时卡死界面。
+        """
+        for _ in range(64):
+            try:
+                event = self.conversion_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = event[0]
+            if kind == 'log':
+                self.log(event[1], event[2])
+            elif kind == 'progress':
+                self._update_progress(*event[1:])
+            elif kind == 'status':
+                self.status_label.config(text=event[1])
+            elif kind == 'buttons':
+                self._set_converting_ui(event[1])
+            elif kind == 'error_dialog':
+                messagebox.showerror(event[1], event[2])
+            elif kind == 'ask_clear':
+                response = messagebox.askyesno(
+                    "转换完成",
+                    f"转换已完成！\n成功: {event[1]} 个\n失败: {event[2]} 个\n\n是否清空文件列表？"
+                )
+                if response:
+                    self.clear_files()
+
+        self.root.after(_interval, self._pump)
+
+    def _set_converting_ui(self, converting):
+        """切换按钮的转换中/空闲状态"""
+        self.start_btn.config(state=tk.DISABLED if converting else tk.NORMAL)
+        self.stop_btn.config(state=tk.NORMAL if converting else tk.DISABLED)
+        self.clear_btn.config(state=tk.DISABLED if converting else tk.NORMAL)
+
     def log(self, message, tag=None):
-        """添加日志"""
-        self.log_text.insert(tk.END, message + "\n", tag)
+        """添加日志（先入缓冲，定时批量刷新；工作线程调用时经队列转发）"""
+        if threading.current_thread() is not threading.main_thread():
+            self.conversion_queue.put(('log', message, tag))
+            return
+        self._log_buf.append((message, tag))
+        if not self._log_flush_pending:
+            self._log_flush_pending = True
+            self.root.after(50, self._flush_log)
+
+    def _flush_log(self):
+        """把缓冲的日志批量写入文本框
+
+        大批量转换时每个文件会产生多条日志，逐条 insert + 重绘
+        会拖慢界面；这里把相邻同 tag 的日志合并成一次 insert，
+        每次刷新只滚动一次，重绘交给 Tk 空闲任务处理。
+        """
+        self._log_flush_pending = False
+        if not self._log_buf:
+            return
+
+        lines = []
+        current_tag = None
+        while self._log_buf:
+            message, tag = self._log_buf.popleft()
+            if lines and tag != current_tag:
+                self.log_text.insert(tk.END, '\n'.join(lines) + '\n', current_tag)
+                lines = []
+            current_tag = tag
+            lines.append(message)
+        if lines:
+            self.log_text.insert(tk.END, '\n'.join(lines) + '\n', current_tag)
+
         self.log_text.see(tk.END)
-        self.log_text.update()
-        
+
     def on_format_change(self, event=None):
         """格式变化时更新质量选项"""
         output_format = self.output_format_var.get()
@@ -331,24 +522,42 @@ class AudioConverterApp:
             self.quality_var.set("高质量 (256 kbps)")
             self.quality_combo['values'] = ["高质量 (256 kbps)", "中等质量 (192 kbps)", "低质量 (128 kbps)"]
     
+    def _iter_audio(self, root):
+        """递归遍历目录，产出所有音频文件路径
+
+        os.scandir 的 DirEntry 自带目录项类型缓存，相比 os.walk +
+        Path(...).suffix 免去了逐文件的 stat 调用和 Path 对象分配。
+        读不了的目录直接跳过，与 os.walk 默认的容错行为一致。
+        """
+        try:
+            entries = os.scandir(root)
+        except OSError:
+            return
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    yield from self._iter_audio(entry.path)
+                elif is_file:
+                    _, dot, ext = entry.name.rpartition('.')
+                    if dot and ext.lower() in _AUDIO_EXT_NAMES:
+                        yield entry.path
+
     @staticmethod
     def get_supported_extensions():
         """获取支持的音频格式扩展名"""
-        return {'.flac', '.wav', '.ogg', '.m4a', '.aac', '.wma', '.mp3', '.opus', '.aiff', '.au'}
+        return _SUPPORTED_EXTS
         
     def on_drop(self, event):
         """处理拖拽的文件"""
-        # 处理 Windows 路径格式（大括号）
-        files_str = event.data
-        if files_str.startswith('{') and files_str.endswith('}'):
-            files_str = files_str[1:-1]
-        
-        # 分割文件路径
-        if os.name == 'nt':  # Windows
-            files = files_str.split('}')
-        else:  # Unix/Linux
-            files = files_str.split()
-        
+        # 一次正则扫描完成分词，正确处理带空格的 {大括号} 路径，
+        # 不再按平台区分 split
+        files = [m.group(1) or m.group(2) for m in _DND_RE.finditer(event.data)]
+
         # 过滤音频文件
         audio_extensions = self.get_supported_extensions()
         audio_files = []
@@ -364,10 +573,7 @@ class AudioConverterApp:
                         audio_files.append(file_path)
                 elif os.path.isdir(file_path):
                     # 如果是文件夹，递归查找音频文件
-                    for root, dirs, filenames in os.walk(file_path):
-                        for filename in filenames:
-                            if Path(filename).suffix.lower() in audio_extensions:
-                                audio_files.append(os.path.join(root, filename))
+                    audio_files.extend(self._iter_audio(file_path))
         
         if audio_files:
             self.file_list.extend(audio_files)
@@ -405,14 +611,8 @@ class AudioConverterApp:
         folder = filedialog.askdirectory(title="选择文件夹")
         
         if folder:
-            audio_extensions = self.get_supported_extensions()
-            files = []
-            
-            for root, dirs, filenames in os.walk(folder):
-                for filename in filenames:
-                    if Path(filename).suffix.lower() in audio_extensions:
-                        files.append(os.path.join(root, filename))
-            
+            files = list(self._iter_audio(folder))
+
             if files:
                 self.file_list.extend(files)
                 self.file_path_var.set(f"已选择 {len(self.file_list)} 个文件")
@@ -426,171 +626,333 @@ class AudioConverterApp:
         self.file_list.clear()
         self.file_path_var.set("")
         self.start_btn.config(state=tk.DISABLED)
-        self.progress_var.set(0)
-        self.status_var.set("等待选择文件...")
+        self.progress_bar['value'] = 0
+        self.status_label.config(text="等待选择文件...")
         self.log("🗑️ 已清空文件列表", 'info')
         
+    def _update_progress(self, progress, message, force=False):
+        """更新进度条和状态文字
+
+        直接配置控件，绕过 Tcl 变量 trace，并把刷新频率限制在约 10 Hz；
+        force 用于批次收尾时确保最终进度一定显示出来。
+        """
+        now = time.monotonic()
+        if not force and now - self._last_ui_update < 0.1:
+            return
+        self._last_ui_update = now
+        self.progress_bar['value'] = progress
+        self.status_label.config(text=message)
+
+    def _worker_count(self):
+        """计算并行转换的工作线程数"""
+        cpu_count = os.cpu_count() or 1
+        try:
+            requested = int(self.worker_count_var.get())
+        except (tk.TclError, ValueError):
+            requested = cpu_count
+        # 不超过文件数，至少为 1
+        return max(1, min(requested, len(self.file_list) or 1))
+
     def get_quality_bitrate(self):
         """获取质量对应的比特率"""
         quality = self.quality_var.get()
-        if "高质量" in quality:
-            return "192"
-        elif "中等质量" in quality:
-            return "128"
-        else:
-            return "64"
+        for label, bitrate in _QUALITY_BITRATE.items():
+            if label in quality:
+                return bitrate
+        return _QUALITY_BITRATE['低质量']
             
-    def convert_file(self, input_file, output_file):
+    @staticmethod
+    def _probe_ffmpeg():
+        """探测 ffmpeg 可执行文件路径和可用的音频编码器
+
+        只在启动时运行一次：既免去每个文件都重复扫描 scoop/WinGet
+        等安装目录的开销，也让转换可以优先选用更好的编码器。
+        """
+        # 常见的 ffmpeg 安装路径（可能不在 PATH 中）
+        user_path = os.environ.get('USERPROFILE', '')
+        ffmpeg_paths = [
+            os.path.join(user_path, 'scoop', 'shims'),
+            os.path.join(user_path, 'AppData', 'Local', 'Microsoft', 'WinGet', 'Packages'),
+            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Programs', 'ffmpeg'),
+            os.path.join(os.environ.get('PROGRAMFILES', ''), 'ffmpeg', 'bin'),
+        ]
+
+        search_path = os.pathsep.join(
+            [os.environ.get('PATH', '')] +
+            [p for p in ffmpeg_paths if os.path.exists(p)]
+        )
+        ffmpeg_path = shutil.which('ffmpeg', path=search_path) or 'ffmpeg'
+
+        # 解析 -encoders 输出，记录所有可用的音频编码器
+        encoders = set()
+        try:
+            result = subprocess.run(
+                [ffmpeg_path, '-hide_banner', '-encoders'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                timeout=10
+            )
+            for line in result.stdout.decode('utf-8', errors='ignore').splitlines():
+                # 每行形如 " A....D aac    AAC (Advanced Audio Coding)"
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].startswith('A'):
+                    encoders.add(parts[1])
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+        return ffmpeg_path, encoders
+
+    def _aac_codec(self):
+        """选择 AAC 编码器，优先使用探测到的高质量实现"""
+        for codec in ('libfdk_aac', 'aac_at'):
+            if codec in self._encoders:
+                return codec
+        return 'aac'
+
+    def _output_args(self):
+        """根据输出格式和质量生成编码器参数"""
+        output_format = self._batch_output_format
+        quality = self._batch_quality
+
+        codec, extra, bitrates = _CODEC_TABLE[output_format]
+        cmd = list(extra)
+        cmd.extend(['-codec:a', codec or self._aac_codec()])
+
+        if bitrates is None:
+            # 无损格式：质量档位控制采样率，"无损"保持原始采样率
+            if '无损' not in quality:
+                cmd.extend(['-ar', '48000' if '高质量' in quality else '44100'])
+        else:
+            for label, bitrate in bitrates.items():
+                if label in quality:
+                    cmd.extend(['-b:a', bitrate])
+                    break
+            else:
+                cmd.extend(['-b:a', bitrates['低质量']])
+
+        return cmd
+
+    async def _run_ffmpeg(self, cmd, timeout=300):
+        """执行 ffmpeg 命令并返回结果"""
+        # 异步子进程：所有 ffmpeg 的等待和 stderr 排空由同一个事件循环完成，
+        # 不再为每个在途任务占用一条带独立栈的工作线程
+        proc = await asyncio.create_subprocess_exec(*cmd, **self._exec_kwargs)
+        self._active_procs.add(proc)
+
+        # Linux: 把 stderr 管道的内核缓冲区从默认 64 KB 扩到 1 MB，
+        # 减少 ffmpeg 写满管道后等待排空的次数，也让事件循环每次唤醒
+        # 能批量读走更多数据
+        if HAS_PIPE_RESIZE:
+            try:
+                pipe = proc._transport.get_pipe_transport(2).get_extra_info('pipe')
+                fcntl.fcntl(pipe.fileno(), fcntl.F_SETPIPE_SZ, 1024 * 1024)
+            except Exception:
+                pass
+
+        # 持续排空 stderr，只保留末尾 16 KB 用于错误分类，
+        # 避免 ffmpeg 因管道写满而阻塞编码
+        tail = bytearray()
+
+        async def _drain():
+            while True:
+                chunk = await proc.stderr.read(65536)
+                if not chunk:
+                    break
+                tail.extend(chunk)
+                del tail[:-16384]
+
+        drain_task = asyncio.ensure_future(_drain())
+
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            drain_task.cancel()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        finally:
+            self._active_procs.discard(proc)
+
+        await drain_task
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout=b'', stderr=bytes(tail))
+
+    async def _probe_audio(self, path):
+        """探测输入文件首条音频流的编码器和比特率
+
+        结果按 (路径, mtime) 缓存，同一文件重复转换不再重复探测。
+        """
+        try:
+            key = (path, os.path.getmtime(path))
+        except OSError:
+            return None
+        if key in self._probe_cache:
+            return self._probe_cache[key]
+
+        cmd = [self._ffprobe_path, '-v', 'error', '-select_streams', 'a:0',
+               '-show_entries', 'stream=codec_name,bit_rate,sample_rate',
+               '-of', 'json', path]
+
+        # 复用平台相关的启动参数（Windows 不弹控制台窗口、POSIX 独立
+        # 进程组），只改写探测需要的标准流
+        probe_kwargs = {
+            **self._exec_kwargs,
+            'stdout': asyncio.subprocess.PIPE,
+            'stderr': asyncio.subprocess.DEVNULL,
+        }
+
+        info = None
+        try:
+            proc = await asyncio.create_subprocess_exec(*cmd, **probe_kwargs)
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=30)
+            if proc.returncode == 0:
+                streams = json.loads(stdout.decode('utf-8', errors='ignore')).get('streams')
+                if streams:
+                    info = streams[0]
+        except (OSError, ValueError, asyncio.TimeoutError):
+            info = None
+
+        self._probe_cache[key] = info
+        return info
+
+    async def _stream_copy_args(self, input_file):
+        """输入编码已满足目标时返回流拷贝参数，否则返回 None
+
+        流拷贝跳过整个解码+编码流程，速度只受磁盘带宽限制。
+        """
+        output_format = self._batch_output_format
+        source_codec = _COPYABLE_CODEC.get(output_format)
+        if source_codec is None:
+            return None
+
+        info = await self._probe_audio(input_file)
+        if not info or info.get('codec_name') != source_codec:
+            return None
+
+        _, extra, bitrates = _CODEC_TABLE[output_format]
+        quality = self._batch_quality
+        if bitrates is None:
+            # 无损格式："无损"档位保持原始采样率，可以直接拷贝；
+            # 指定了采样率的档位则要求输入采样率恰好一致，否则仍需重采样
+            if '无损' not in quality:
+                target_rate = '48000' if '高质量' in quality else '44100'
+                if str(info.get('sample_rate')) != target_rate:
+                    return None
+        else:
+            # 有损格式还要求输入比特率接近目标档位（容差 16 kbps）
+            target = next((b for label, b in bitrates.items() if label in quality),
+                          bitrates['低质量'])
+            try:
+                source_rate = int(info.get('bit_rate'))
+            except (TypeError, ValueError):
+                return None
+            if abs(source_rate - int(target.rstrip('k')) * 1000) >= 16000:
+                return None
+
+        return list(extra) + ['-c:a', 'copy']
+
+    async def _convert_group(self, files):
+        """用一次 ffmpeg 调用转换一组文件
+
+        多个 -i 输入配合多组 -map 输出，一个进程完成整组转换，
+        把进程启动和编解码器初始化的固定开销摊薄到整组文件上。
+        整组失败时回退到逐个文件转换，以便定位具体出错的文件。
+        """
+        output_format = self._batch_output_format
+        threads = str(self.ffmpeg_threads_per_job)
+        output_args = self._output_args()
+
+        cmd = [self._ffmpeg_path, '-y']
+        for input_file in files:
+            cmd.extend(['-threads', threads, '-i', input_file])
+
+        output_files = []
+        for i, input_file in enumerate(files):
+            output_file = os.path.join(self.output_dir, Path(input_file).stem + '.' + output_format)
+            cmd.extend(['-map', f'{i}:a', '-vn'])
+            cmd.extend(output_args)
+            cmd.extend(['-threads', threads])
+            cmd.append(output_file)
+            output_files.append(output_file)
+
+        try:
+            result = await self._run_ffmpeg(cmd, timeout=300 * len(files))
+            if result.returncode == 0:
+                return [(f, True, out) for f, out in zip(files, output_files)]
+        except Exception:
+            pass
+
+        # 停止转换也会让整组 ffmpeg 以非零返回码退出，此时不能回退，
+        # 否则会为整组文件重新拉起新进程
+        if not self.is_converting:
+            return []
+
+        # 回退：逐个转换，失败信息可以精确到文件
+        results = []
+        for f in files:
+            if not self.is_converting:
+                break
+            success, message = await self.convert_file(f, "")
+            results.append((f, success, message))
+        return results
+
+    @staticmethod
+    def _classify_error(stderr):
+        """从 ffmpeg 的 stderr 字节流中提炼错误信息
+
+        单次正则扫描代替多轮子串查找，直接在字节上匹配、
+        只解码命中的片段，不对整段输出做无谓的 utf-8 解码。
+        """
+        match = _ERR_RE.search(stderr)
+        if match:
+            token = match.group()
+            if token == b'Invalid data':
+                return "输入文件数据无效或损坏"
+            if token == b'Permission denied':
+                return "权限被拒绝，无法写入文件"
+            if token == b'No space left':
+                return "磁盘空间不足"
+            return f"FFmpeg错误: {token.decode('utf-8', errors='ignore').strip()}"
+
+        # 没有命中任何标记：返回最后一个非空行
+        for line in reversed(stderr.split(b'\n')):
+            line = line.strip()
+            if line:
+                return f"转换失败: {line.decode('utf-8', errors='ignore')}"
+        return "转换失败: 未知错误"
+
+    async def convert_file(self, input_file, output_file):
         """转换单个文件"""
         try:
             # 生成输出文件路径（保存到音乐文件夹）
             input_path = Path(input_file)
-            output_format = self.output_format_var.get()
+            output_format = self._batch_output_format
             output_file = os.path.join(self.output_dir, input_path.stem + '.' + output_format)
-            
+
             # 构建转换命令
-            cmd = ['ffmpeg', '-y', '-i', input_file, '-vn']  # -vn: 不处理视频流
-            
+            # -threads: 限制解码线程数，避免 N 个并行 ffmpeg 各自再开满核心数的线程
+            threads = str(self.ffmpeg_threads_per_job)
+            cmd = [self._ffmpeg_path, '-y', '-threads', threads, '-i', input_file, '-vn']  # -vn: 不处理视频流
+
             # 记录命令用于调试
             self.debug_cmd = ' '.join(f'"{arg}"' if ' ' in str(arg) else str(arg) for arg in cmd)
-            
-            # 根据输出格式设置编码器
-            quality = self.quality_var.get()
-            
-            if output_format == 'mp3':
-                cmd.extend(['-codec:a', 'libmp3lame'])
-                if '高质量' in quality:
-                    cmd.extend(['-b:a', '192k'])
-                elif '中等质量' in quality:
-                    cmd.extend(['-b:a', '128k'])
-                else:
-                    cmd.extend(['-b:a', '64k'])
-            elif output_format == 'flac':
-                cmd.extend(['-codec:a', 'flac'])
-                if '无损' not in quality:
-                    if '高质量' in quality:
-                        cmd.extend(['-ar', '48000'])
-                    else:
-                        cmd.extend(['-ar', '44100'])
-            elif output_format == 'wav':
-                cmd.extend(['-codec:a', 'pcm_s16le'])
-                if '无损' not in quality:
-                    if '高质量' in quality:
-                        cmd.extend(['-ar', '48000'])
-                    else:
-                        cmd.extend(['-ar', '44100'])
-            elif output_format == 'ogg':
-                cmd.extend(['-codec:a', 'libvorbis'])
-                if '高质量' in quality:
-                    cmd.extend(['-b:a', '256k'])
-                elif '中等质量' in quality:
-                    cmd.extend(['-b:a', '192k'])
-                else:
-                    cmd.extend(['-b:a', '128k'])
-            elif output_format == 'm4a':
-                # m4a 使用 mov 容器格式
-                cmd.extend(['-vn'])  # 不处理视频流
-                cmd.extend(['-f', 'mov'])
-                cmd.extend(['-codec:a', 'aac'])
-                if '高质量' in quality:
-                    cmd.extend(['-b:a', '256k'])
-                elif '中等质量' in quality:
-                    cmd.extend(['-b:a', '192k'])
-                else:
-                    cmd.extend(['-b:a', '128k'])
-            elif output_format == 'aac':
-                cmd.extend(['-codec:a', 'aac'])
-                if '高质量' in quality:
-                    cmd.extend(['-b:a', '192k'])
-                elif '中等质量' in quality:
-                    cmd.extend(['-b:a', '128k'])
-                else:
-                    cmd.extend(['-b:a', '64k'])
-            elif output_format == 'wma':
-                cmd.extend(['-codec:a', 'wmav2'])
-                if '高质量' in quality:
-                    cmd.extend(['-b:a', '192k'])
-                elif '中等质量' in quality:
-                    cmd.extend(['-b:a', '128k'])
-                else:
-                    cmd.extend(['-b:a', '64k'])
-            
+
+            # 根据输出格式设置编码器；输入编码已满足目标时直接流拷贝
+            output_args = await self._stream_copy_args(input_file)
+            if output_args is None:
+                output_args = self._output_args()
+            cmd.extend(output_args)
+
+            # 编码端同样限制线程数，保证核心在并行任务之间干净地切分
+            cmd.extend(['-threads', threads])
             cmd.append(output_file)
-            
-            # 调试：显示完整命令
-            import shlex
-            cmd_str = ' '.join(shlex.quote(str(arg)) for arg in cmd)
-            # 在实际执行时，这个日志会被 conversion_worker 中的日志调用覆盖
-            # 所以我们只在这里记录命令，不直接输出
-            
-            # 设置环境变量以包含 ffmpeg 路径
-            env = os.environ.copy()
-            system_path = os.environ.get('PATH', '')
-            user_path = os.environ.get('USERPROFILE', '')
-            
-            # 添加常见的 ffmpeg 安装路径
-            ffmpeg_paths = [
-                os.path.join(user_path, 'scoop', 'shims'),
-                os.path.join(user_path, 'AppData', 'Local', 'Microsoft', 'WinGet', 'Packages'),
-                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Programs', 'ffmpeg'),
-                os.path.join(os.environ.get('PROGRAMFILES', ''), 'ffmpeg', 'bin'),
-            ]
-            
-            for path in ffmpeg_paths:
-                if os.path.exists(path) and path not in system_path:
-                    system_path = path + os.pathsep + system_path
-            
-            env['PATH'] = system_path
-            
-            # 在 Windows 上处理路径中的空格和特殊字符
-            if os.name == 'nt':
-                # Windows: 确保路径被正确处理
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    env=env,
-                    timeout=300,  # 5分钟超时
-                    startupinfo=startupinfo,
-                    creationflags=subprocess.CREATE_NO_WINDOW
-                )
-            else:
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    env=env,
-                    timeout=300  # 5分钟超时
-                )
-            
+
+            result = await self._run_ffmpeg(cmd)
+
             if result.returncode == 0:
                 return True, output_file  # 返回输出文件路径
             else:
-                # 将 stderr 错误信息解码并返回
-                error_msg = result.stderr.decode('utf-8', errors='ignore')
-                # 提取关键错误信息
-                if 'Invalid data' in error_msg:
-                    return False, "输入文件数据无效或损坏"
-                elif 'Permission denied' in error_msg:
-                    return False, "权限被拒绝，无法写入文件"
-                elif 'No space left' in error_msg:
-                    return False, "磁盘空间不足"
-                elif 'Error' in error_msg:
-                    # 查找包含 Error 的行
-                    for line in error_msg.split('\n'):
-                        if 'Error' in line and 'ffmpeg' not in line.lower():
-                            # 附加命令信息用于调试
-                            cmd_info = getattr(self, 'debug_cmd', '')
-                            return False, f"FFmpeg错误: {line.strip()}"
-                    # 如果没找到具体的 Error 行，返回最后一行
-                    return False, f"FFmpeg错误: {error_msg.split('\n')[-1].strip()}"
-                else:
-                    # 返回最后一行的错误信息
-                    last_line = [l for l in error_msg.split('\n') if l.strip()][-1] if error_msg else "未知错误"
-                    return False, f"转换失败: {last_line}"
-                
+                return False, self._classify_error(result.stderr)
+
         except subprocess.TimeoutExpired:
             return False, "转换超时"
         except Exception as e:
@@ -602,11 +964,15 @@ class AudioConverterApp:
             messagebox.showwarning("警告", "请先选择要转换的文件")
             return
             
+        # 趁还在主线程，快照本批次用到的所有界面设置
+        self._batch_output_format = self.output_format_var.get()
+        self._batch_quality = self.quality_var.get()
+        self._batch_delete_original = self.delete_original_var.get()
+        self._batch_worker_count = self._worker_count()
+
         self.is_converting = True
-        self.start_btn.config(state=tk.DISABLED)
-        self.stop_btn.config(state=tk.NORMAL)
-        self.clear_btn.config(state=tk.DISABLED)
-        
+        self._set_converting_ui(True)
+
         # 在新线程中执行转换
         thread = threading.Thread(target=self.conversion_worker, daemon=True)
         thread.start()
@@ -615,83 +981,178 @@ class AudioConverterApp:
         """停止转换"""
         self.is_converting = False
         self.log("⏸️ 正在停止转换...", 'warning')
-        self.status_var.set("已停止")
-        self.start_btn.config(state=tk.NORMAL)
+
+        # 立即终止在跑的 ffmpeg，而不是等它们最长 5 分钟的超时；
+        # 先把本批次的进程快照下来，宽限期强杀只清算这份快照，
+        # 不会误伤之后新开批次的进程
+        stopped_procs = list(self._active_procs)
+        for proc in stopped_procs:
+            try:
+                if os.name == 'posix':
+                    # 整个进程组一起终止，连带 ffmpeg 可能派生的子进程
+                    os.killpg(proc.pid, signal.SIGTERM)
+                else:
+                    proc.terminate()
+            except (ProcessLookupError, OSError):
+                pass
+
+        # 两秒宽限期后仍未退出的直接强杀
+        self.root.after(2000, self._kill_stragglers, stopped_procs)
+
+        self.status_label.config(text="已停止")
+        # 只禁用停止按钮；开始/清空按钮等工作线程真正退出、
+        # 投递 ('buttons', False) 事件后才恢复，避免旧批次还在
+        # 收尾时就开下一批
         self.stop_btn.config(state=tk.DISABLED)
-        self.clear_btn.config(state=tk.NORMAL)
+
+    def _kill_stragglers(self, procs):
+        """强杀宽限期内没有响应 SIGTERM 的 ffmpeg 进程"""
+        for proc in procs:
+            try:
+                if proc.returncode is None:
+                    proc.kill()
+            except (ProcessLookupError, OSError):
+                pass
         
-    def conversion_worker(self):
-        """转换工作线程"""
+    async def _run_batch(self):
+        """在事件循环中并发调度各组转换任务
+
+        单线程协作式调度：信号量限制同时在跑的 ffmpeg 数量，
+        各子进程的等待与 stderr 排空由事件循环统一完成，
+        不再为每个在途任务占用一条工作线程。
+        """
         total_files = len(self.file_list)
         converted_files = 0
         failed_files = []
-        delete_original = self.delete_original_var.get()
-        output_format = self.output_format_var.get()
-        
+        delete_original = self._batch_delete_original
+        output_format = self._batch_output_format
+
+        worker_count = self._batch_worker_count
+        self.ffmpeg_threads_per_job = max(1, (os.cpu_count() or 1) // worker_count)
+        completed = 0
+        to_delete = []
+
+        semaphore = asyncio.Semaphore(worker_count)
+
+        # 批次规划：先并发探测哪些文件的输入编码已满足目标、可以流拷贝。
+        # 这些文件不进重编码组，单独走 convert_file——探测结果已缓存，
+        # 其中会直接命中 -c:a copy 快速路径
+        async def plan_one(input_file):
+            async with semaphore:
+                if not self.is_converting:
+                    return input_file, None
+                return input_file, await self._stream_copy_args(input_file)
+
+        planned = await asyncio.gather(*(plan_one(f) for f in self.file_list))
+        copy_files = [f for f, copy_args in planned if copy_args is not None]
+        encode_files = [f for f, copy_args in planned if copy_args is None]
+
+        # 输出格式和质量是全局设置，需要重编码的文件同键，直接按大小分组；
+        # 每组一次 ffmpeg 调用，摊薄进程启动开销，同时限制命令长度和失败影响范围
+        group_size = 16
+        groups = [encode_files[i:i + group_size]
+                  for i in range(0, len(encode_files), group_size)]
+
+        async def convert_one(group):
+            async with semaphore:
+                if not self.is_converting:
+                    return None  # 已请求停止，未开始的组直接跳过
+                return await self._convert_group(group)
+
+        async def copy_one(input_file):
+            async with semaphore:
+                if not self.is_converting:
+                    return None
+                success, message = await self.convert_file(input_file, "")
+                return [(input_file, success, message)]
+
+        tasks = [asyncio.ensure_future(convert_one(g)) for g in groups]
+        tasks += [asyncio.ensure_future(copy_one(f)) for f in copy_files]
+        for task in asyncio.as_completed(tasks):
+            results = await task
+            if results is None:
+                continue
+
+            for input_file, success, message in results:
+                file_name = Path(input_file).name
+                completed += 1
+                self.log(f"\n[{completed}/{total_files}] 🎵 {file_name} → {output_format.upper()}", 'info')
+
+                if success:
+                    converted_files += 1
+                    output_path = Path(message)
+                    self.log(f"  ✅ 转换成功", 'success')
+                    self.log(f"  💾 保存位置: {output_path}", 'info')
+
+                    # 原文件先记下来，批次结束后统一删除
+                    if delete_original:
+                        to_delete.append(input_file)
+                else:
+                    failed_files.append((file_name, message))
+                    self.log(f"  ❌ 转换失败: {message}", 'error')
+
+            # 进度事件经队列投递，由主线程的泵统一执行
+            progress = (completed / total_files) * 100
+            self.conversion_queue.put((
+                'progress', progress,
+                f"进度: {completed}/{total_files} ({progress:.1f}%)"))
+
+        # 收尾强制刷新一次，确保进度条停在真实完成度上
+        progress = (completed / total_files) * 100
+        self.conversion_queue.put((
+            'progress', progress,
+            f"进度: {completed}/{total_files} ({progress:.1f}%)", True))
+
+        # 转换全部结束后一次性删除原文件：集中 unlink 让系统合并目录
+        # 元数据更新，也避免删除和下一个 ffmpeg 的读取在磁盘上互相穿插
+        if to_delete:
+            deleted = 0
+            for path in to_delete:
+                try:
+                    if HAS_SEND2TRASH:
+                        send2trash(path)  # 放入回收站，可撤销
+                    else:
+                        os.unlink(path)
+                    deleted += 1
+                except OSError as e:
+                    self.log(f"  ❌ 删除原文件失败: {path}: {e}", 'error')
+            self.log(f"🗑️ 已删除 {deleted} 个原文件", 'warning')
+
+        if not self.is_converting:
+            self.log("⚠️ 转换已取消", 'warning')
+
+        return converted_files, failed_files
+
+    def conversion_worker(self):
+        """转换工作线程"""
+        total_files = len(self.file_list)
+        output_format = self._batch_output_format
+
         self.log("="*60, 'info')
         self.log(f"🚀 开始转换 {total_files} 个文件...", 'info')
         self.log(f"📝 输出格式: {output_format.upper()}", 'info')
         self.log(f"📁 输出目录: {self.output_dir}", 'info')
         self.log("="*60, 'info')
-        self.status_var.set(f"准备转换 {total_files} 个文件...")
-        
+        self.conversion_queue.put(('status', f"准备转换 {total_files} 个文件..."))
+
         # 检查输出目录是否可写
         if not os.access(self.output_dir, os.W_OK):
             self.log(f"❌ 错误: 输出目录不可写 - {self.output_dir}", 'error')
-            messagebox.showerror("错误", f"无法写入输出目录:\n{self.output_dir}\n\n请检查目录权限。")
+            self.conversion_queue.put((
+                'error_dialog', "错误",
+                f"无法写入输出目录:\n{self.output_dir}\n\n请检查目录权限。"))
             self.is_converting = False
-            self.start_btn.config(state=tk.NORMAL)
-            self.stop_btn.config(state=tk.DISABLED)
-            self.clear_btn.config(state=tk.NORMAL)
+            self.conversion_queue.put(('buttons', False))
             return
         
-        for i, input_file in enumerate(self.file_list):
-            if not self.is_converting:
-                self.log("⚠️ 转换已取消", 'warning')
-                break
-                
-            try:
-                # 显示当前转换的文件
-                input_path = Path(input_file)
-                file_name = input_path.name
-                self.log(f"\n[{i+1}/{total_files}] 🎵 {file_name} → {output_format.upper()}", 'info')
-                self.status_var.set(f"正在转换: {file_name}")
-                
-                # 执行转换
-                success, message = self.convert_file(input_file, "")
-                
-                if success:
-                    converted_files += 1
-                    output_path = Path(message)
-                    self.log(f"  ✅ 转换成功", 'success')
-                    self.log(f"  💾 保存位置: {output_path}", 'info')
-                    
-                    # 删除原文件
-                    if delete_original:
-                        try:
-                            os.remove(input_file)
-                            self.log(f"  🗑️ 已删除原文件", 'warning')
-                        except Exception as e:
-                            self.log(f"  ❌ 删除原文件失败: {str(e)}", 'error')
-                else:
-                    failed_files.append((file_name, message))
-                    self.log(f"  ❌ 转换失败: {message}", 'error')
-                    
-                # 更新进度
-                progress = ((i + 1) / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_var.set(f"进度: {i+1}/{total_files} ({progress:.1f}%)")
-                
-            except Exception as e:
-                failed_files.append((input_file, str(e)))
-                self.log(f"  ❌ 处理文件时出错: {str(e)}", 'error')
-                
+        # 事件循环负责并发调度各组 ffmpeg；转换线程只承载这个循环，
+        # Tk 主循环保持响应
+        converted_files, failed_files = asyncio.run(self._run_batch())
+
         # 转换完成
         self.is_converting = False
-        self.start_btn.config(state=tk.NORMAL)
-        self.stop_btn.config(state=tk.DISABLED)
-        self.clear_btn.config(state=tk.NORMAL)
-        
+        self.conversion_queue.put(('buttons', False))
+
         # 显示结果
         self.log("\n" + "="*60, 'info')
         self.log(f"🎉 转换完成！", 'info')
@@ -703,16 +1164,11 @@ class AudioConverterApp:
             for file_name, error in failed_files:
                 self.log(f"  • {file_name}: {error}", 'error')
                 
-        self.status_var.set(f"✅ 转换完成: {converted_files}/{total_files} 成功")
-        
-        # 询问是否清空列表
+        self.conversion_queue.put(('status', f"✅ 转换完成: {converted_files}/{total_files} 成功"))
+
+        # 询问是否清空列表（对话框同样由主线程的泵弹出）
         if converted_files > 0:
-            response = messagebox.askyesno(
-                "转换完成",
-                f"转换已完成！\n成功: {converted_files} 个\n失败: {len(failed_files)} 个\n\n是否清空文件列表？"
-            )
-            if response:
-                self.root.after(0, self.clear_files)
+            self.conversion_queue.put(('ask_clear', converted_files, len(failed_files)))
 
 
 def main():